@@ -12,7 +12,7 @@ COPYTARGET_BASEPATH = '//192.168.128.150/UrkSp/Import'
 UPDATE_PATH = '//192.168.128.150/UrkSp/Import/_dist'
 
 BUILDS = (
-	# user (for label),	target path in import directory,	path to log directory
+	# user (for label and executable name),	target path in import directory,	path to log directory
 	('LKA 711',			f'{COPYTARGET_BASEPATH}/LKA 711',	f'{COPYTARGET_BASEPATH}/_logs/LKA 711'),
 	('LKA 712',			f'{COPYTARGET_BASEPATH}/LKA 712',	f'{COPYTARGET_BASEPATH}/_logs/LKA 712'),
 	('LKA 713',			f'{COPYTARGET_BASEPATH}/LKA 713',	f'{COPYTARGET_BASEPATH}/_logs/LKA 713'),
@@ -33,7 +33,8 @@ BUILDS = (
 )
 
 from pathlib import Path
-from shutil import rmtree
+from shutil import rmtree, copyfile
+from hashlib import file_digest
 import PyInstaller.__main__
 
 if __name__ == '__main__':	# start here
@@ -44,32 +45,38 @@ if __name__ == '__main__':	# start here
 	build_path.mkdir(exist_ok=True)
 	tmp_path = build_path / 'slowcopy_tmp.py'
 	slowcopy_version = __version__
-	for user, dst, log in BUILDS:
-		print(f'\nBulding executable for {user}\n')
-		with tmp_path.open(mode='w', encoding='utf-8') as f:
-			for line in cwd_path.joinpath('slowcopy.py').read_text(encoding='utf-8').split('\n'):
-				if line.startswith('__distribution__ ='):
-					print(f"__distribution__ = '{user}'", file=f)
-				elif line.startswith('__destination__ ='):
-					print(f"__destination__ = '{dst}'", file=f)
-				elif line.startswith('__logging__ ='):
-					print(f"__logging__ = '{log}'", file=f)
-				elif line.startswith('__update__ ='):
-					print(f"__update__ = '{UPDATE_PATH}'", file=f)
-				else:
-					print(line, file=f)
-					if line.startswith('__version__ ='):
-						slowcopy_version = line.split('=')[1].strip().strip('"\'')
-		slowcopy_name = f"slowcopy-{user.lower().replace(' ', '')}_v{slowcopy_version}"
-		PyInstaller.__main__.run([
-			'--onefile',
-			'--noconsole',
-			'--name', slowcopy_name,
-			'--icon', f'{icon_path}',
-			f'{tmp_path}'
-		])
-		cwd_path.joinpath(f'{slowcopy_name}.spec').unlink(missing_ok=True)
+	profiles = {user: (dst, log) for user, dst, log in BUILDS}
+	with tmp_path.open(mode='w', encoding='utf-8') as f:
+		for line in cwd_path.joinpath('slowcopy.py').read_text(encoding='utf-8').split('\n'):
+			if line.startswith('__distribution__ ='):
+				print("__distribution__ = ''", file=f)	# profile has to be selected at runtime
+			elif line.startswith('__destination__ ='):
+				print("__destination__ = ''", file=f)
+			elif line.startswith('__logging__ ='):
+				print("__logging__ = ''", file=f)
+			elif line.startswith('__update__ ='):
+				print(f"__update__ = '{UPDATE_PATH}'", file=f)
+			elif line.startswith('__profiles__ ='):
+				print(f'__profiles__ = {profiles!r}', file=f)
+			else:
+				print(line, file=f)
+				if line.startswith('__version__ ='):
+					slowcopy_version = line.split('=')[1].strip().strip('"\'')
+	slowcopy_name = f'slowcopy_v{slowcopy_version}'
+	print(f'\nBulding executable {slowcopy_name}\n')
+	PyInstaller.__main__.run([
+		'--onefile',
+		'--noconsole',
+		'--name', slowcopy_name,
+		'--icon', f'{icon_path}',
+		f'{tmp_path}'
+	])
+	cwd_path.joinpath(f'{slowcopy_name}.spec').unlink(missing_ok=True)
 	rmtree(build_path)
+	exe_path = dist_path / f'{slowcopy_name}.exe'
+	with exe_path.open('rb') as fh:
+		dist_path.joinpath(f'{exe_path.name}.sha256').write_text(f'{file_digest(fh, "sha256").hexdigest()}  {exe_path.name}', encoding='utf-8')
+	for user, dst, log in BUILDS:	# the profile is selected by the executable name
+		copyfile(exe_path, dist_path / f"slowcopy-{user.lower().replace(' ', '').replace('_', '')}_v{slowcopy_version}.exe")
 	dist_path.joinpath('version.txt').write_text(slowcopy_version, encoding='utf-8')
 	print(f'\nAll done, check {dist_path} for new build executables.\n')
-
@@ -15,20 +15,28 @@ __destination__ = 'P:/test_import/'	# path for testruns
 __logging__ = 'P:/test_logs/'	# path for testruns
 #__update__ = '//192.168.128.150/UrkSp/Import/_dist'	# look for updates
 __update__ = 'P:/SlowCopy/dist/'	# path for testruns
+__profiles__ = {__distribution__: (__destination__, __logging__)}	# distribution: (destination, logging), filled by make-slowcopy.py
 
 ### standard libs ###
 import logging
+from logging.handlers import QueueHandler, QueueListener, BufferingHandler
+from queue import SimpleQueue
 from sys import executable as __executable__
 from pathlib import Path
-from shutil import rmtree
+from shutil import rmtree, disk_usage
+from os import fsync
+from json import loads, dumps
 from argparse import ArgumentParser
 from re import search, sub
 from subprocess import Popen, PIPE, STDOUT, STARTUPINFO, STARTF_USESHOWWINDOW
-from threading import Thread
+from threading import Thread, Lock, Event
 from zipfile import ZipFile, ZIP_DEFLATED
-from hashlib import file_digest
+from hashlib import md5 as md5_hash, sha256
 from multiprocessing import Pool, cpu_count
-from time import strftime, sleep, perf_counter
+from time import strftime, sleep, perf_counter, perf_counter_ns, time, monotonic
+from tempfile import gettempdir
+from cProfile import Profile
+import tracemalloc
 from datetime import timedelta
 ### tk libs ###
 from tkinter import Tk, PhotoImage
@@ -42,11 +50,18 @@ from idlelib.tooltip import Hovertip
 class RoboCopy(Popen):
 	'''Use Popen to run tools on Windows'''
 
-	def __init__(self, src, dst):
-		'''Create robocopy process'''
+	def __init__(self, src, dst, threads=None, unbuffered=False, compress=True):
+		'''Create robocopy process, single threaded if threads is None'''
 		self.startupinfo = STARTUPINFO()
 		self.startupinfo.dwFlags |= STARTF_USESHOWWINDOW
-		super().__init__(['Robocopy.exe', src, dst, '/e', '/compress', '/fp', '/ns', '/njh', '/njs', '/nc', '/unicode'],
+		cmd = ['Robocopy.exe', src, dst, '/e', '/fp', '/ns', '/njh', '/njs', '/nc', '/unicode']
+		if threads:
+			cmd.append(f'/mt:{threads}')
+		if unbuffered:
+			cmd.append('/j')
+		if compress:
+			cmd.append('/compress')
+		super().__init__(cmd,
 			stdout = PIPE,
 			stderr = STDOUT,
 			encoding = 'utf-8',
@@ -64,28 +79,315 @@ class RoboCopy(Popen):
 class HashThread(Thread):
 	'''Calculate hashes'''
 
-	@staticmethod
-	def md5(path):
-		'''Calculate md5 hash of file'''
-		with path.open('rb') as fh:
-			return file_digest(fh, 'md5').hexdigest()
-
-	def __init__(self, file_paths):
+	def __init__(self, file_paths, logger=logging, profiler=None, chunk_size=2**18):
 		'''Generate object to calculate hashes'''
 		super().__init__()
 		self.file_paths = file_paths
+		self.logger = logger
+		self.profiler = profiler if profiler else Profiler()
+		self.buffer = bytearray(chunk_size)
+		self.view = memoryview(self.buffer)
+		self.read_calls = 0
+		self.error = None
+
+	def md5(self, path):
+		'''Calculate md5 hash of file'''
+		hash_obj = md5_hash()
+		with path.open('rb', buffering=0) as fh:
+			while size := fh.readinto(self.buffer):
+				self.read_calls += 1
+				hash_obj.update(self.view[:size])
+		self.read_calls += 1	# last read returns 0 bytes
+		return hash_obj.hexdigest()
 
 	def run(self):
 		'''Calculate hashes'''
-		logging.info(f'Starte Berechnung von {len(self.file_paths)} Hash-Werten')
-		self.hashes = [self.md5(path) for path in self.file_paths]
-		logging.info('Hash-Wert-Berechnung ist abgeschlossen')
+		self.logger.info(f'Starte Berechnung von {len(self.file_paths)} Hash-Werten')
+		start = perf_counter_ns()
+		try:
+			self.hashes = [self.md5(path) for path in self.file_paths]
+		except Exception as ex:
+			self.error = ex
+			self.logger.error(f'Hash-Wert-Berechnung ist fehlgeschlagen:\n{ex}')
+			return
+		self.profiler.add_time('hash', perf_counter_ns() - start)
+		self.profiler.count(hash_files=len(self.hashes), open_calls=len(self.hashes), read_calls=self.read_calls)
+		self.logger.info('Hash-Wert-Berechnung ist abgeschlossen')
 
 	def get_hashes(self):
 		'''Return relative paths and hashes'''
 		for path, md5 in zip(self.file_paths, self.hashes):
 			yield path, md5
 
+class PreFlight:
+	'''Probe source and destination to choose copy and hash parameters'''
+
+	PROBE_FILES = 3					# number of largest source files to read
+	PROBE_BYTES = 8*2**20			# bytes to read from source and to write to destination
+	PROBE_MIN_BYTES = PROBE_BYTES // 2	# less read from source does not give a usable throughput
+	PROBE_SMALL = 5					# number of small files to measure latency of destination
+	PROBE_NAME = '_slowcopy_probe.tmp'	# temporary file in destination directory
+	CHUNK = 2**20					# chunk size to read and write while probing
+	DEFAULTS = {					# parameters without usable measurements (same as without pre-flight)
+		'threads': None,
+		'unbuffered': False,
+		'compress': True,
+		'hash_chunk': 2**18
+	}
+
+	@staticmethod
+	def choose(src_mbps, dst_mbps, dst_latency_ms, avg_size):
+		'''Choose parameters for Robocopy.exe and hashing from measured values'''
+		if src_mbps < 50:			# e.g. USB 2 or old hdd, parallel access would make it slower
+			threads = None
+		elif dst_latency_ms > 20:	# slow network, many parallel transfers hide latency
+			threads = 32
+		elif dst_latency_ms > 5:
+			threads = 16
+		else:
+			threads = 8
+		if src_mbps >= 200:
+			hash_chunk = 4*2**20
+		elif src_mbps >= 50:
+			hash_chunk = 2**20
+		else:
+			hash_chunk = 2**18
+		return {
+			'threads': threads,
+			'unbuffered': avg_size > 16*2**20 and dst_mbps > 100,	# large files on fast connection
+			'compress': dst_mbps < 50,	# only worth the cpu time on slow or congested network
+			'hash_chunk': hash_chunk
+		}
+
+	@staticmethod
+	def load(cache_path, key, max_age):
+		'''Get cached measurements for key if not expired'''
+		try:
+			measured = loads(cache_path.read_text(encoding='utf-8'))[key]
+		except Exception:
+			return
+		if time() - measured['time'] <= max_age:
+			return measured
+
+	@staticmethod
+	def save(cache_path, key, measured):
+		'''Store measurements for key'''
+		try:
+			cache = loads(cache_path.read_text(encoding='utf-8'))
+		except Exception:
+			cache = dict()
+		cache[key] = measured
+		cache_path.write_text(dumps(cache, indent='\t'), encoding='utf-8')
+
+	def __init__(self, src_paths, src_sizes, dst_path):
+		'''Generate object to probe'''
+		self.src_paths = src_paths
+		self.src_sizes = src_sizes
+		self.dst_path = dst_path
+
+	def read_throughput(self):
+		'''Read from the largest source files, return MB/s or None if they are too small'''
+		samples = sorted(zip(self.src_sizes, self.src_paths), key=lambda sample: sample[0], reverse=True)
+		remaining = self.PROBE_BYTES
+		read_bytes = 0
+		start = perf_counter()
+		for size, path in samples[:self.PROBE_FILES]:
+			with path.open('rb', buffering=0) as fh:
+				while remaining > 0 and (chunk := fh.read(min(self.CHUNK, remaining))):
+					read_bytes += len(chunk)
+					remaining -= len(chunk)
+			if remaining <= 0:
+				break
+		if read_bytes < self.PROBE_MIN_BYTES:	# would measure latency to open files
+			return
+		return read_bytes / 10**6 / max(perf_counter() - start, 10**-9)
+
+	def write_probe(self):
+		'''Write small files and one larger file to destination, return latency in ms and MB/s'''
+		probe_path = self.dst_path / self.PROBE_NAME
+		chunk = bytes(self.CHUNK)
+		try:
+			start = perf_counter()
+			for cnt in range(self.PROBE_SMALL):
+				probe_path.write_bytes(chunk[:4096])
+				probe_path.unlink()
+			latency_ms = 1000 * (perf_counter() - start) / self.PROBE_SMALL
+			start = perf_counter()
+			with probe_path.open('wb', buffering=0) as fh:
+				for cnt in range(self.PROBE_BYTES // self.CHUNK):
+					fh.write(chunk)
+				fsync(fh.fileno())
+			mbps = self.PROBE_BYTES / 10**6 / max(perf_counter() - start, 10**-9)
+		finally:
+			probe_path.unlink(missing_ok=True)
+		return latency_ms, mbps
+
+	def run(self):
+		'''Run all probes, return measured values or None if source is too small to measure'''
+		src_mbps = self.read_throughput()
+		if src_mbps is None:	# do not probe destination for nothing
+			return
+		dst_latency_ms, dst_mbps = self.write_probe()
+		return {
+			'time': time(),
+			'src_mbps': round(src_mbps, 1),
+			'dst_mbps': round(dst_mbps, 1),
+			'dst_latency_ms': round(dst_latency_ms, 2)
+		}
+
+class Profiler:
+	'''Measure phases and count files, bytes and file system calls,
+		mode: None (off), "timer", "cprofile", "tracemalloc" or "all"
+	'''
+
+	MODES = ('timer', 'cprofile', 'tracemalloc', 'all')
+	MEMORY_TOP = 25		# number of lines with the most allocated memory
+
+	def __init__(self, mode=None):
+		'''Generate profiler, nothing is measured if mode is None'''
+		self.enabled = bool(mode)
+		self.cprofile = Profile() if mode in ('cprofile', 'all') else None	# since Python 3.12 all threads are recorded
+		self.memory = mode in ('tracemalloc', 'all')
+		self.times = dict()		# phase: nanoseconds
+		self.counters = dict()
+		self.snapshot = None
+		self.peak = 0
+		self._lock = Lock()
+		self._phase = None
+		self._phase_start = 0
+
+	def start(self):
+		'''Start cProfile and tracemalloc if requested'''
+		if self.memory:
+			tracemalloc.start()
+		if self.cprofile:
+			self.cprofile.enable()
+
+	def phase(self, name=None):
+		'''Stop current phase and start the given one'''
+		if not self.enabled:
+			return
+		now = perf_counter_ns()
+		if self._phase:
+			self.add_time(self._phase, now - self._phase_start)
+		self._phase = name
+		self._phase_start = now
+
+	def add_time(self, name, ns):
+		'''Add nanoseconds to phase'''
+		if self.enabled:
+			with self._lock:
+				self.times[name] = self.times.get(name, 0) + ns
+
+	def count(self, **counters):
+		'''Add to counters'''
+		if self.enabled:
+			with self._lock:
+				for key, value in counters.items():
+					self.counters[key] = self.counters.get(key, 0) + value
+
+	def stop(self):
+		'''Stop measuring'''
+		self.phase()
+		if self.cprofile:
+			self.cprofile.disable()
+		if self.memory and tracemalloc.is_tracing():
+			self.snapshot = tracemalloc.take_snapshot()
+			self.peak = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+
+	def write(self, path):
+		'''Write profile as TSV, cProfile statistics go to file with extension .pstats'''
+		tsv = 'Messwert\tWert'
+		for name, ns in self.times.items():
+			tsv += f'\n{name}_seconds\t{ns/10**9:.6f}'
+		for name, value in self.counters.items():
+			tsv += f'\n{name}\t{value}'
+		tsv += f"\nestimated_fs_calls\t{sum(self.counters.get(key, 0) for key in ('stat_calls', 'open_calls', 'read_calls'))}"
+		if self.snapshot:
+			tsv += f'\nmemory_peak_bytes\t{self.peak}'
+			for stat in self.snapshot.statistics('lineno')[:self.MEMORY_TOP]:
+				tsv += f'\nmemory {stat.traceback}\t{stat.size}'
+		path.write_text(tsv, encoding='utf-8')
+		if self.cprofile:
+			self.cprofile.dump_stats(path.with_suffix('.pstats'))
+
+class LogBuffer(BufferingHandler):
+	'''Buffer log records locally and append them in batches to the log file'''
+
+	MAX_BACKOFF = 300	# max. seconds between retries when log file is not reachable
+
+	def __init__(self, path, capacity, interval):
+		'''Generate handler, errors are written immediately, the rest at least every interval seconds'''
+		super().__init__(capacity)
+		self.path = path
+		self.spool_path = Path(gettempdir()) / f'slowcopy-{path.parent.name}-{path.name}'	# local while log file is not reachable
+		self.interval = interval
+		self.failed = False
+		self._spooled = False
+		self._backoff = interval
+		self._retry_at = 0
+		self._stop = Event()
+		Thread(target=self._flush_loop, daemon=True).start()
+
+	def _flush_loop(self):
+		'''Flush periodically so the log on the share does not lag behind, only here failed writes are retried'''
+		while not self._stop.wait(self.interval):
+			self.flush(retry=True)
+
+	def shouldFlush(self, record):
+		'''Flush when buffer is full or on errors'''
+		return len(self.buffer) >= self.capacity or record.levelno >= logging.ERROR
+
+	def _spool(self, text, mode='a'):
+		'''Write to local file'''
+		try:
+			with self.spool_path.open(mode, encoding='utf-8') as fh:
+				fh.write(text)
+		except Exception:
+			return	# nothing left to write to
+		self._spooled = True
+
+	def flush(self, retry=False, force=False):
+		'''Write all buffered records with one append, spool them locally while log file is not reachable'''
+		self.acquire()
+		try:
+			if not self.buffer and not self._spooled:
+				return
+			last_record = self.buffer[-1] if self.buffer else None
+			text = ''.join(f'{self.format(record)}\n' for record in self.buffer)
+			self.buffer.clear()
+			if self.failed and not force and not (retry and monotonic() >= self._retry_at):
+				self._spool(text)
+				return
+			try:
+				if self._spooled:
+					text = self.spool_path.read_text(encoding='utf-8') + text
+				with self.path.open('a', encoding='utf-8') as fh:
+					fh.write(text)
+			except Exception:
+				if self.failed:
+					self._backoff = min(2 * self._backoff, self.MAX_BACKOFF)
+				elif last_record:	# report only the first error
+					self.handleError(last_record)
+				self.failed = True
+				self._retry_at = monotonic() + self._backoff
+				self._spool(text, mode='w')
+			else:
+				self.failed = False
+				self._backoff = self.interval
+				if self._spooled:
+					self.spool_path.unlink(missing_ok=True)
+					self._spooled = False
+		finally:
+			self.release()
+
+	def close(self):
+		'''Stop periodic flushing and try one last time to write what is left'''
+		self._stop.set()
+		self.flush(force=True)
+		super().close()
+
 class Copy:
 	'''Copy functionality'''
 
@@ -95,9 +397,17 @@ class Copy:
 	DST_PATH = Path(__destination__)	# root directory to copy
 	LOG_PATH = Path(__logging__)		# directory to write logs that trigger surveillance
 	LOG_NAME = 'log.txt' 				# log file name
+	LOG_BATCH = 256						# number of log records to buffer before writing to LOG_PATH
+	LOG_INTERVAL = 5					# seconds between writes of buffered log records to LOG_PATH
+	PROFILE_NAME = 'profile.txt'		# file name for profile in log directory (option --profile)
+	TUNING_PATH = Path.home() / '.slowcopy_tuning.json'	# cached pre-flight measurements per destination
+	TUNING_MAX_AGE = 7*24*3600			# seconds until destination is probed again
 	TSV_NAME = 'fertig.txt'				# file name for csv output textfile - file is generaten when all is done
 	UPDATE_PATH = Path(__update__)		# directory where updates can be found
 	UPDATE_NAME = 'version.txt'			# trigger filename for updates (textfile with version number)
+	UPDATE_CHUNK = 1024*1024			# chunk size to stream the update executable
+	PROFILES = __profiles__				# distribution: (destination, logging)
+	EXE_REG = r'^slowcopy-(.+?)_v'		# get distribution from executable name
 	MAX_PATH_LEN = 230					# throw error when paths have more chars
 	BLACKLIST_FILES = (				# prohibited at path depth 1
 		'fertig.txt',
@@ -123,11 +433,45 @@ class Copy:
 		if _int(new_version) > _int(__version__):
 			return new_version
 
+	@staticmethod
+	def _key(distribution):
+		'''Normalize distribution name to compare with executable name or command line argument'''
+		return distribution.lower().replace(' ', '').replace('_', '')
+
+	@staticmethod
+	def set_profile(name=None):
+		'''Select distribution profile by given name or executable name'''
+		if not name:
+			if match := search(Copy.EXE_REG, Path(__executable__).name.lower()):
+				name = match.group(1)
+			else:
+				name = __distribution__
+		for distribution, (destination, logging_path) in Copy.PROFILES.items():
+			if Copy._key(distribution) == Copy._key(name):
+				Copy.DISTRIBUTION = distribution
+				Copy.DST_PATH = Path(destination)
+				Copy.LOG_PATH = Path(logging_path)
+				return
+		return f'Keine Distribution {name} gefunden, möglich sind: {", ".join(Copy.PROFILES)}'
+
 	@staticmethod
 	def download_update(version, dir_path):
-		'''Download updatet version'''
-		filename = f"slowcopy-{Copy.DISTRIBUTION.lower().replace(' ', '')}_v{version}.exe"
-		dir_path.joinpath(filename).write_bytes(Copy.UPDATE_PATH.joinpath(filename).read_bytes())
+		'''Download updatet version (one executable for all distributions) and verify SHA256'''
+		src_path = Copy.UPDATE_PATH / f'slowcopy_v{version}.exe'
+		expected = Copy.UPDATE_PATH.joinpath(f'{src_path.name}.sha256').read_text(encoding='utf-8').split()[0].lower()
+		dst_path = dir_path / f"slowcopy-{Copy._key(Copy.DISTRIBUTION)}_v{version}.exe"
+		tmp_path = dst_path.with_suffix('.part')
+		hash_obj = sha256()
+		try:
+			with src_path.open('rb') as src_fh, tmp_path.open('wb') as dst_fh:
+				while chunk := src_fh.read(Copy.UPDATE_CHUNK):
+					hash_obj.update(chunk)
+					dst_fh.write(chunk)
+			if hash_obj.hexdigest() != expected:
+				raise ValueError(f'SHA256 von {src_path} stimmt nicht überein')
+			tmp_path.replace(dst_path)
+		finally:
+			tmp_path.unlink(missing_ok=True)
 
 	@staticmethod
 	def bad_destination():
@@ -209,14 +553,18 @@ class Copy:
 			return format_b.format(b=size)
 		return format_k.format(iec=iec, si=si, b=size)
 
-	def __init__(self, root_path, echo=print, check_paths=True):
+	def __init__(self, root_path, echo=print, check_paths=True, profile=None):
 		'''Generate object to copy and to zip'''
 		self.root_path = root_path.resolve()
 		self.echo = echo
+		self.profiler = Profiler(profile)
+		self.logger = logging.getLogger(f'slowcopy.{self.root_path.name}')	# one logger per case
+		self.logger.propagate = False
 		if ex := self.bad_destination(self.root_path):
 			raise ValueError(ex)
 		if ex := self.bad_source(self.root_path):
 			raise ValueError(ex)
+		deleted = list()	# messages to log when logging has started
 		for path, msg in self.blacklisted_files(self.root_path):
 			if not path:
 				break
@@ -227,8 +575,8 @@ class Copy:
 					except Exception as ex:
 						echo(f'Konnte Datei {path} nicht löschen:\n{ex}')
 						raise OSError(ex)
-					msg = 'Die Datei {path} wurde auf Wunsch des Anwenders gelöscht'
-					logging.info(msg)
+					msg = f'Die Datei {path} wurde auf Wunsch des Anwenders gelöscht'
+					deleted.append(msg)
 					echo(msg)
 				else:
 					return
@@ -246,8 +594,8 @@ class Copy:
 						except Exception as ex:
 							echo(f'Konnte Verzeichnis {path} nicht löschen:\n{ex}')
 							raise OSError(ex)
-						msg = 'Das Verzeichnis {path} wurde auf Wunsch des Anwenders gelöscht'
-						logging.info(msg)
+						msg = f'Das Verzeichnis {path} wurde auf Wunsch des Anwenders gelöscht'
+						deleted.append(msg)
 						echo(msg)
 					elif answer == 'kopieren':
 						continue
@@ -268,44 +616,132 @@ class Copy:
 			echo(f'Kann das Log-Verzeichnis {log_path} nicht erstellen:\n{ex}')
 			raise OSError(ex)
 		start_time = perf_counter()
-		try:
-			logging.basicConfig(	# start logging
-				level = self.LOGLEVEL,
-				filename = log_path / f'{strftime('%y%m%d-%H%M')}-{self.LOG_NAME}',
-				format = '%(asctime)s %(levelname)s: %(message)s',
+		try:	# start logging in background thread, records are written in batches
+			log_buffer = LogBuffer(log_path / f'{strftime('%y%m%d-%H%M')}-{self.LOG_NAME}', self.LOG_BATCH, self.LOG_INTERVAL)
+			log_buffer.setFormatter(logging.Formatter(
+				fmt = '%(asctime)s %(levelname)s: %(message)s',
 				datefmt = '%Y-%m-%d %H:%M:%S'
-			)
+			))
+			log_queue = SimpleQueue()
+			self.log_listener = QueueListener(log_queue, log_buffer)
+			self.logger.handlers.clear()
+			self.logger.addHandler(QueueHandler(log_queue))
+			self.logger.setLevel(self.LOGLEVEL)
+			self.log_listener.start()
 		except Exception as ex:
 			echo(f'Kann das Loggen nicht starten:\n{ex}')
 			raise RuntimeError(ex)
+		for msg in deleted:
+			self.logger.info(msg)
+		try:
+			self.profiler.start()
+			self._run(log_path, start_time)
+		finally:	# write buffered log records also on errors or abort
+			self.profiler.stop()
+			if self.profiler.enabled:
+				profile_path = log_path / f'{strftime('%y%m%d-%H%M')}-{self.PROFILE_NAME}'
+				try:
+					self.profiler.write(profile_path)
+				except Exception as ex:
+					self.logger.error(f'Konnte Profil {profile_path} nicht erzeugen:\n{ex}')
+				else:
+					self.logger.info(f'Profil wurde nach {profile_path} geschrieben')
+			try:	# do not hide the original exception
+				self.log_listener.stop()
+				log_buffer.close()
+			except Exception as ex:
+				echo(f'WARNING: Log-Datei konnte nicht vollständig geschrieben werden:\n{ex}')
+			else:
+				if log_buffer.failed:
+					echo(f'WARNING: Log-Datei {log_buffer.path} war nicht erreichbar, das Log liegt in {log_buffer.spool_path}')
+			self.logger.handlers.clear()
+
+	def _preflight(self):
+		'''Check free space and choose parameters by probing or from cache'''
+		needed = self.total_bytes
+		try:
+			free = disk_usage(self.dst_path).free
+			if free < needed and any(self.dst_path.iterdir()):	# resumed after abort, only the rest is copied
+				for path, size in zip(self.src_file_paths, self.src_file_sizes):
+					try:
+						needed -= min(size, self.dst_path.joinpath(path.relative_to(self.root_path)).stat().st_size)
+					except OSError:
+						pass
+		except Exception as ex:
+			self.logger.warning(f'Freier Speicherplatz in {self.dst_path} konnte nicht ermittelt werden:\n{ex}')
+		else:
+			if free < needed:
+				msg = f'Nicht genug Speicherplatz in {self.dst_path}: {self._bytes(free)} frei, {self._bytes(needed)} benötigt'
+				self.logger.error(msg)
+				raise OSError(msg)
+		key = f'{self.DST_PATH.absolute()} <= {self.root_path.anchor}'	# destination and source drive
+		if measured := PreFlight.load(self.TUNING_PATH, key, self.TUNING_MAX_AGE):
+			self.logger.info(f'Verwende gespeicherte Messwerte für {key}: {measured}')
+		else:
+			msg = 'Messe Lese- und Schreibgeschwindigkeit'
+			self.logger.info(msg)
+			self.echo(msg)
+			try:
+				measured = PreFlight(self.src_file_paths, self.src_file_sizes, self.dst_path).run()
+			except Exception as ex:
+				self.logger.warning(f'Messung ist fehlgeschlagen, verwende Standardwerte {PreFlight.DEFAULTS}:\n{ex}')
+				return dict(PreFlight.DEFAULTS)
+			if not measured:	# not cached, a larger case can be measured later
+				self.logger.info(f'Zu wenig Daten für eine Messung, verwende Standardwerte {PreFlight.DEFAULTS}')
+				return dict(PreFlight.DEFAULTS)
+			self.logger.info(f'Messwerte: {measured}')
+			try:
+				PreFlight.save(self.TUNING_PATH, key, measured)
+			except Exception as ex:
+				self.logger.warning(f'Konnte Messwerte nicht in {self.TUNING_PATH} speichern:\n{ex}')
+		tuning = PreFlight.choose(measured['src_mbps'], measured['dst_mbps'], measured['dst_latency_ms'],
+			self.total_bytes / max(len(self.src_file_paths), 1))
+		self.logger.info(f'Parameter: {tuning}')
+		return tuning
+
+	def _run(self, log_path, start_time):
+		'''Copy, verify and write hashes'''
+		echo = self.echo
 		msg = f'Lese Verzeichnisstruktur von {self.root_path}'
-		logging.info(msg)
+		self.logger.info(msg)
 		echo(msg)
 		self.src_file_paths = list()
 		self.src_file_sizes = list()
 		self.total_bytes = 0
+		self.profiler.phase('scan')
+		entries = 0
 		try:
 			for path in self.root_path.rglob('*'):	# analyze root structure
+				entries += 1
 				if path.is_file():
 					size = path.stat().st_size
 					self.src_file_paths.append(path)
 					self.src_file_sizes.append(size)
 					self.total_bytes += size
 		except Exception as ex:
-			logging.error(ex)
+			self.logger.error(ex)
 			raise RuntimeError(ex)
+		self.profiler.count(entries=entries, files=len(self.src_file_paths), bytes=self.total_bytes,
+			stat_calls=entries+len(self.src_file_paths))
+		self.profiler.phase('preflight')
+		tuning = self._preflight()
 		msg = f'Starte das Kopieren von {self.root_path} nach {self.dst_path}, {self._bytes(self.total_bytes)}'
-		logging.info(msg)
+		self.logger.info(msg)
 		echo(msg)
 		try:
-			hash_thread = HashThread(self.src_file_paths)
+			hash_thread = HashThread(self.src_file_paths, logger=self.logger, profiler=self.profiler, chunk_size=tuning['hash_chunk'])
 			echo(f'Starte Berechnung von {len(self.src_file_paths)} MD5-Hashes')
 			hash_thread.start()
 		except Exception as ex:
 			msg = f'Konnte Thread, der Hash-Werte bilden soll, nicht starten:\n{ex}'
-			logging.error(msg)
+			self.logger.error(msg)
 			echo(f'FEHLER: {msg}')
-		proc = RoboCopy(self.root_path, self.dst_path)
+		self.profiler.phase('robocopy')
+		proc = RoboCopy(self.root_path, self.dst_path,
+			threads = tuning['threads'],
+			unbuffered = tuning['unbuffered'],
+			compress = tuning['compress']
+		)
 		for line in proc.run():
 			if line.endswith('%'):
 				self.echo(line, end='\r')
@@ -314,14 +750,16 @@ class Copy:
 		returncode = proc.wait()
 		if returncode > 3:
 			msg = f'Robocopy.exe hatte ein Problem beim kopieren von Dateien aus {self.root_path} nach {self.dst_path}, Rückgabewert: {returncode}'
-			logging.error(msg)
+			self.logger.error(msg)
 			raise ChildProcessError(ex)
 		msg = 'Robocopy.exe ist fertig, starte Überprüfung anhand Dateigröße'
-		logging.info(msg)
+		self.logger.info(msg)
 		echo(msg)
+		self.profiler.phase('verify')
 		errors = 0
 		mismatches = 0
 		total = len(self.src_file_paths)
+		self.profiler.count(stat_calls=total)
 		for cnt, (src_path, src_size) in enumerate(zip(self.src_file_paths, self.src_file_sizes), start=1):
 			echo(f'{int(100*cnt/total)}%', end='\r')
 			dst_path = self.dst_path.joinpath(src_path.relative_to(self.root_path))
@@ -329,21 +767,22 @@ class Copy:
 				dst_size = dst_path.stat().st_size
 			except Exception as ex:
 				msg = f'Dateigröße von {dst_path} konnte nicht ermittelt werden:\n{ex}'
-				logging.warning(msg)
+				self.logger.warning(msg)
 				echo(f'WARNING: {msg}')
 				errors += 1
 			else:
 				if dst_size != src_size:
 					msg = f'Dateigrößenabweichung: {src_path} => {src_size}, {dst_path} => {dst_size}'
-					logging.warning(msg)
+					self.logger.warning(msg)
 					echo(f'WARNING: {msg}')
 					mismatches += 1
 		msg = 'Überprüfung anhand Dateigröße ist abgeschlossen'
-		logging.info(msg)
+		self.logger.info(msg)
 		echo(msg)
+		self.profiler.phase('hash_wait')
 		if hash_thread.is_alive():
 			msg = 'Führe die Hash-Wert-Berechnung fort'
-			logging.info(msg)
+			self.logger.info(msg)
 			echo(msg)
 			index = 0
 			while hash_thread.is_alive():
@@ -354,40 +793,46 @@ class Copy:
 				sleep(.25)
 			echo('MD5-Hashes-Berechnung ist abgeschlossen')
 		hash_thread.join()
+		if hash_thread.error:
+			msg = f'Hash-Werte konnten nicht berechnet werden:\n{hash_thread.error}'
+			self.logger.error(msg)
+			raise RuntimeError(msg)
+		self.profiler.phase('tsv')
 		tsv = 'Pfad\tMD5-Hash'
 		for path, md5 in hash_thread.get_hashes():
 			tsv += f'\n{path.relative_to(self.root_path.parent)}\t{md5}'
 		log_tsv_path = log_path / f'{strftime('%y%m%d-%H%M')}-{self.TSV_NAME}'
 		try:
+			self.profiler.count(open_calls=1)
 			log_tsv_path.write_text(tsv, encoding='utf-8')
 		except Exception as ex:
 			msg = f'Konnte Log-Datei {log_tsv_path} nicht erzeugen:\n{ex}'
-			logging.error(msg)
+			self.logger.error(msg)
 			raise OSError(ex)
 		if errors:
 			msg = f'Die Größe von {errors} Datei(en) konnte nicht ermittelt werden'
-			logging.error(msg)
+			self.logger.error(msg)
 			if not mismatches:
 				raise OSError(msg)
 			echo(f'WARNING: {msg}')
 		if mismatches:
 			msg = f'Bei {mismatches} Datei(en) stimmt die Größe der Zieldatei nicht mit der Ausgangsdatei überein'
-			logging.error(msg)
+			self.logger.error(msg)
 			raise RuntimeError(msg)
 		dst_tsv_path = self.dst_path / self.TSV_NAME
 		try:
+			self.profiler.count(open_calls=1)
 			dst_tsv_path.write_text(tsv, encoding='utf-8')
 		except Exception as ex:
 			msg = f'Konnte {dst_tsv_path} nicht erzeugen:\n{ex}'
-			logging.error(msg)
+			self.logger.error(msg)
 			echo(msg)
 			raise OSError(ex)
 		end_time = perf_counter()
 		delta = end_time - start_time
 		msg = f'Fertig - das Kopieren dauerte {timedelta(seconds=delta)} (Stunden, Minuten, Sekunden)'
-		logging.info(msg)
+		self.logger.info(msg)
 		echo(msg)
-		logging.shutdown()
 
 class Worker(Thread):
 	'''Thread that does the work while Tk is running the GUI'''
@@ -402,7 +847,7 @@ class Worker(Thread):
 		'''Run thread'''
 		for source_path in self.gui.source_paths:
 			try:
-				copy = Copy(source_path, echo=self.gui.echo, check_paths=self.gui.check_paths)
+				copy = Copy(source_path, echo=self.gui.echo, check_paths=self.gui.check_paths, profile=self.gui.profile)
 			except Exception as ex:
 				self.gui.echo(f'FEHLER: {ex}')
 				self.errors = True
@@ -414,16 +859,16 @@ class Gui(Tk):
 	PAD = 4
 	X_FACTOR = 60
 	Y_FACTOR = 40
-	LABEL = f'Distribution {__distribution__}'
 	GREEN_FG = 'black'
 	GREEN_BG = 'pale green'
 	RED_FG = 'black'
 	RED_BG = 'coral'
 
-	def __init__(self, dir_path, icon_base64):
+	def __init__(self, dir_path, icon_base64, profile=None):
 		'''Open application window'''
 		super().__init__()
 		self.worker = None
+		self.profile = profile
 		self.title(f'SlowCopy v{__version__}')
 		self.rowconfigure(1, weight=1)
 		self.columnconfigure(1, weight=1)
@@ -442,7 +887,7 @@ class Gui(Tk):
 		frame = Frame(self)
 		frame.grid(row=0, column=0, columnspan=2, sticky='news',
 			ipadx=self.padding, ipady=self.padding, padx=self.padding, pady=self.padding)
-		Label(frame, text=self.LABEL).pack(padx=self.padding, pady=self.padding)
+		Label(frame, text=f'Distribution {Copy.DISTRIBUTION}').pack(padx=self.padding, pady=self.padding)
 		frame = Frame(self)
 		frame.grid(row=1, column=0,	sticky='n')
 		self.source_button = Button(frame, text='Quellverzeichnis', command=self._select_dir)
@@ -637,11 +1082,22 @@ if __name__ == '__main__':  # start here when run as application
 	argparser = ArgumentParser(prog=f'SlowCopy Version {__version__}', description='Copy into MSD network')  
 	argparser.add_argument('-g', '--gui', action='store_true',
 		help='Use GUI with given root directory as command line parameters.')
+	argparser.add_argument('-d', '--distribution', type=str,
+		help='Use profile of given distribution (default is taken from executable name)', metavar='STRING')
+	argparser.add_argument('-p', '--profile', action='store_true',
+		help='Write profile (timers and counters) into log directory')
+	argparser.add_argument('--profile-mode', type=str, default='timer', choices=Profiler.MODES,
+		help='Also record cProfile and/or tracemalloc (implies --profile)')
 	argparser.add_argument('source', nargs='?', help='Source directory', metavar='DIRECTORY')
 	args = argparser.parse_args()
+	profile = args.profile_mode if args.profile or args.profile_mode != 'timer' else None
 	root_path = Path(args.source.strip().strip('"')).absolute() if args.source else None
+	if error := Copy.set_profile(args.distribution):
+		if args.gui or Path(__executable__).name != 'python.exe':
+			showerror(title='Fehler', message=error)
+		raise SystemExit(error)
 	if root_path and not args.gui and Path(__executable__).name == 'python.exe':	# run in terminal
-		copy = Copy(root_path)
+		copy = Copy(root_path, profile=profile)
 	else:	# open gui if no argument is given
 		Gui(root_path, '''iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAMAAABg3Am1AAACEFBMVEUAAAH7AfwVFf8WFv4XF/0Y
 GPwZGfwaGvsaGvwbG/scHPodHfkeHvkfH/kgIPggIPkhIfciIvYjI/UkJPUlJfQnJ/IoKPEpKfAq
@@ -660,5 +1116,5 @@ k2HxaOQ5plpP59/jFEls6NoD8GyQtpY06BR+wCOR2e+/ljmcTYpUXP5mNQah+VcDVImKw3otRLsT
 IRnQ1Ek/63j1E9LuxiHIAJ7XiJYLPWCfojbkQx6N2jlfEqNJudij2EsQAGjldO8ghxR+CgYA9zHa
 RpHICgDYTXGxXYMyaMVotS18/uELXES3TCulURn8iChuWseJa1+g4H0YFEq7os9OaPBS8gEY2pVs
 OpO9dT3HqebSmYPLji8QQEyVYIoEY4qE6o5+cgD8xYF9mcXPV12fPIIrXx13KAAAAAAASUVORK5C
-YII=''').mainloop()	# give tk the icon as base64 and open main window
+YII=''', profile=profile).mainloop()	# give tk the icon as base64 and open main window
 